@@ -1,21 +1,54 @@
 import os
+import sys
+import json
 import time
+import queue
+import hashlib
+import logging
+import logging.handlers
+import threading
 import requests
 import datetime as dt
-from typing import Dict
+from collections import defaultdict
+from operator import attrgetter, itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+# orjson parses the offer payloads several times faster; stdlib json is the fallback
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Log records are queued by the caller and written by a listener thread, so worker
+# threads never block on stdout (GitHub Actions flushes every line)
+log = logging.getLogger("amadeus")
+log.setLevel(logging.INFO)
+LOG_QUEUE = queue.Queue(-1)
+log.addHandler(logging.handlers.QueueHandler(LOG_QUEUE))
+LOG_LISTENER = logging.handlers.QueueListener(LOG_QUEUE, logging.StreamHandler(sys.stdout))
 
 # -------- Config (env-driven) --------
 AMADEUS_KEY = os.environ["AMADEUS_KEY"]
 AMADEUS_SECRET = os.environ["AMADEUS_SECRET"]
 
-ORIGINS = [x.strip() for x in os.environ.get("ORIGINS", "AUS,IAH,DFW").split(",") if x.strip()]
+# dict.fromkeys drops repeated codes (keeping order) so no query is sent twice
+ORIGINS = list(dict.fromkeys(x.strip() for x in os.environ.get("ORIGINS", "AUS,IAH,DFW").split(",") if x.strip()))
 # You can set DEST to "TYO" (city) or "HND,NRT" (we loop them safely)
-DEST_CODES = [x.strip() for x in os.environ.get("DEST", "TYO").split(",") if x.strip()]
+DEST_CODES = list(dict.fromkeys(x.strip() for x in os.environ.get("DEST", "TYO").split(",") if x.strip()))
+# A city code already covers its airports, so skip those when both are listed
+CITY_OF_AIRPORT = {"HND": "TYO", "NRT": "TYO"}
+DEST_CODES = [c for c in DEST_CODES if CITY_OF_AIRPORT.get(c) not in DEST_CODES]
 
 ADULTS = int(os.environ.get("ADULTS", "1"))
 CURRENCY = os.environ.get("CURRENCY", "USD")
 MAX_PRICE_PER_PAX = float(os.environ.get("MAX_PRICE_PER_PAX", "5000"))
 TRIP_LENGTH = int(os.environ.get("TRIP_LENGTH", "14"))
+MAX_PRICE_TOTAL = MAX_PRICE_PER_PAX * ADULTS  # the cap applies to the whole party
 
 # Search window (default next year Jan 20 → May 10 as you had it)
 year = int(os.environ.get("YEAR", str(dt.date.today().year + 1)))
@@ -31,8 +64,98 @@ DISCORD_WEBHOOK = os.environ.get("DISCORD_WEBHOOK")
 # Safety cap for requests per run (avoid blowing free tier)
 MAX_REQUESTS_PER_RUN = int(os.environ.get("MAX_REQUESTS_PER_RUN", "80"))
 
+# Stop searching once a deal at or under this fraction of the cap turns up (0 disables)
+EARLY_EXIT_FRAC = float(os.environ.get("EARLY_EXIT_FRAC", "0"))
+
+# Circuit breaker: after this many consecutive failures stop searching from that
+# origin / abort the run, instead of waiting out timeouts while Amadeus is down
+ORIGIN_FAIL_LIMIT = int(os.environ.get("ORIGIN_FAIL_LIMIT", "3"))
+GLOBAL_FAIL_LIMIT = int(os.environ.get("GLOBAL_FAIL_LIMIT", "5"))
+
+# Searches in flight at once (each one mostly waits on Amadeus)
+CONCURRENCY = int(os.environ.get("CONCURRENCY", "8"))
+
+# Amadeus test env allows ~10 transactions/sec; pace searches under it instead of eating 429s
+QPS = float(os.environ.get("QPS", "10"))
+
+# One pooled session for every call so TCP/TLS connections are kept alive and reused.
+# The pool holds one connection per worker: a smaller pool would close the overflow
+# after each call and pay a fresh TLS handshake on the next one.
+# urllib3 handles 429/5xx retries with backoff (and honors Retry-After). Read
+# timeouts are not retried: a hung search would hold a worker for 5 x 40s.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=max(CONCURRENCY, 16),
+    max_retries=Retry(
+        total=4,
+        read=0,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        raise_on_status=False,  # hand back the last response so we can log its body
+    ),
+))
+# The webhook POST isn't idempotent: a timeout or 5xx may already have posted the
+# message, so only retry 429s (rejected, not delivered) to avoid duplicate alerts
+DISCORD_ADAPTER = HTTPAdapter(max_retries=Retry(
+    total=3,
+    read=0,
+    backoff_factor=1,
+    status_forcelist=[429],
+    allowed_methods=["POST"],
+    raise_on_status=False,
+))
+SESSION.mount("https://discord.com/", DISCORD_ADAPTER)
+SESSION.mount("https://discordapp.com/", DISCORD_ADAPTER)
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "amadeus")
+
+# OAuth tokens live ~30 min; cache them so back-to-back runs skip the auth round-trip.
+# One file per credential set, so several keys can share the cache dir.
+TOKEN_CACHE_PATH = os.path.join(
+    CACHE_DIR,
+    f"token_{hashlib.sha256((AMADEUS_KEY + AMADEUS_SECRET).encode()).hexdigest()[:16]}.json",
+)
+
+# Fares rarely move within a few hours; reuse search responses younger than this.
+# Set NO_CACHE=1 to always hit Amadeus.
+NO_CACHE = bool(os.environ.get("NO_CACHE"))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_HOURS", "6")) * 3600
+SEARCH_CACHE_DIR = os.path.join(CACHE_DIR, "searches")
+
+def write_atomic(path: str, payload: bytes, mode: int = 0o666):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    # mode is applied at creation (before any bytes land) and still filtered by umask
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def load_cached_token():
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            cached = json.load(f)
+        if time.time() < cached["expires_at"] - 60:
+            return cached["access_token"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_cached_token(access_token: str, expires_in: int):
+    try:
+        payload = {"access_token": access_token, "expires_at": time.time() + expires_in}
+        write_atomic(TOKEN_CACHE_PATH, json.dumps(payload).encode(), mode=0o600)  # bearer token: owner only
+    except OSError as e:
+        log.warning("[auth] could not write token cache: %s", e)
+
 def get_token() -> str:
-    r = requests.post(
+    cached = load_cached_token()
+    if cached:
+        log.info("[auth] using cached token")
+        return cached
+
+    r = SESSION.post(
         "https://test.api.amadeus.com/v1/security/oauth2/token",
         data={
             "grant_type": "client_credentials",
@@ -42,139 +165,336 @@ def get_token() -> str:
         timeout=30,
     )
     if not r.ok:
-        print(f"[Auth error {r.status_code}] {r.text[:500]}")
+        log.error("[Auth error %s] %s", r.status_code, r.text[:500])
     r.raise_for_status()
-    return r.json()["access_token"]
+    body = json_loads(r.content)
+    save_cached_token(body["access_token"], int(body.get("expires_in", 1799)))
+    return body["access_token"]
+
+# A cached token can be rejected before its local expiry (revoked, clock skew).
+# The first 401 drops the cache file and re-authenticates once; every worker then
+# switches to the replacement.
+REAUTH_LOCK = threading.Lock()
+REAUTH_DONE = False
+FRESH_TOKEN = None
+
+def refresh_token() -> Optional[str]:
+    global REAUTH_DONE, FRESH_TOKEN
+    with REAUTH_LOCK:
+        if not REAUTH_DONE:
+            REAUTH_DONE = True
+            log.warning("[auth] token rejected; discarding cached token and re-authenticating")
+            try:
+                os.remove(TOKEN_CACHE_PATH)
+            except FileNotFoundError:
+                pass
+            FRESH_TOKEN = get_token()
+        return FRESH_TOKEN
 
 def send_alert(text: str):
     if not DISCORD_WEBHOOK:
-        print("[discord] DISCORD_WEBHOOK not set; skipping alert.")
+        log.info("[discord] DISCORD_WEBHOOK not set; skipping alert.")
         return
     try:
-        resp = requests.post(DISCORD_WEBHOOK, json={"content": text}, timeout=30)
-        print(f"[discord] status={resp.status_code} body={resp.text[:300]}")
+        resp = SESSION.post(DISCORD_WEBHOOK, json={"content": text}, timeout=30)
+        log.info("[discord] status=%s body=%s", resp.status_code, resp.text[:300])
     except Exception as e:
-        print(f"[discord] error: {e}")
+        log.error("[discord] error: %s", e)
+
+def daterange(d1: dt.date, d2: dt.date) -> range:
+    """Day ordinals from d1 through d2 (inclusive); see date.toordinal()."""
+    return range(d1.toordinal(), d2.toordinal() + 1)
+
+# Candidate dates are the same for every origin/dest, so filter them once.
+# Ordinal 1 (0001-01-01) is a Monday, so the weekday is plain integer math and
+# only the surviving days are turned into date objects.
+DEPART_DATES = tuple(
+    dt.date.fromordinal(o) for o in daterange(DEPART_START, DEPART_END) if (o - 1) % 7 in DEPART_WEEKDAYS
+)
+RETURN_DATES = tuple(d + dt.timedelta(days=TRIP_LENGTH) for d in DEPART_DATES)
+
+def search_cache_path(origin: str, dest_code: str, depart: dt.date, ret: dt.date) -> str:
+    # Everything that shapes the response is part of the key
+    key = f"{origin}|{dest_code}|{depart}|{ret}|{ADULTS}|{CURRENCY}|{int(MAX_PRICE_TOTAL)}"
+    return os.path.join(SEARCH_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest()[:24] + ".json")
+
+def load_cached_search(origin: str, dest_code: str, depart: dt.date, ret: dt.date) -> Optional[Dict]:
+    if NO_CACHE:
+        return None
+    path = search_cache_path(origin, dest_code, depart, ret)
+    try:
+        if time.time() - os.path.getmtime(path) >= SEARCH_CACHE_TTL:
+            return None
+        with open(path, "rb") as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+SEARCH_CACHE_PRUNED = threading.Event()
+
+def prune_search_cache():
+    """Delete expired search responses (once per run, on the first write)."""
+    if SEARCH_CACHE_PRUNED.is_set():
+        return
+    SEARCH_CACHE_PRUNED.set()
+    cutoff = time.time() - SEARCH_CACHE_TTL
+    try:
+        names = os.listdir(SEARCH_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(SEARCH_CACHE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def save_cached_search(origin: str, dest_code: str, depart: dt.date, ret: dt.date, payload: bytes):
+    if NO_CACHE:
+        return
+    prune_search_cache()
+    try:
+        write_atomic(search_cache_path(origin, dest_code, depart, ret), payload)
+    except OSError as e:
+        log.warning("[cache] could not write search cache: %s", e)
 
-def daterange(d1: dt.date, d2: dt.date):
-    d = d1
-    while d <= d2:
-        yield d
-        d += dt.timedelta(days=1)
+@dataclass(frozen=True, slots=True)
+class Offer:
+    """The few fields we actually use from a flight offer."""
+    price: float          # total for all pax
+    out_dep: str          # YYYY-MM-DD
+    ret_dep: str          # YYYY-MM-DD
+    carriers: FrozenSet[str]
 
-def search_flights(token: str, origin: str, dest_code: str, depart: dt.date, ret: dt.date) -> Dict:
+def parse_offers(data: Dict, cap: float) -> List[Offer]:
+    """
+    Reduce a raw search response to slim Offer records priced at or under cap.
+    Over-cap and malformed offers are skipped before their itineraries are walked.
+    """
+    offers = []
+    for o in data.get("data", []):
+        try:
+            price = float(o["price"]["total"])
+            if price > cap:
+                continue
+            itineraries = o["itineraries"]
+            offers.append(Offer(
+                price=price,
+                out_dep=itineraries[0]["segments"][0]["departure"]["at"][:10],
+                ret_dep=itineraries[1]["segments"][0]["departure"]["at"][:10],
+                carriers=frozenset(seg["carrierCode"] for itin in itineraries for seg in itin["segments"]),
+            ))
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+    return offers
+
+class RateLimiter:
+    """Leaky bucket shared by all worker threads: starts calls at most qps per second."""
+
+    def __init__(self, qps: float):
+        self.interval = 1.0 / qps if qps > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            slot = max(time.monotonic(), self.next_slot)
+            self.next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+LIMITER = RateLimiter(QPS)
+
+SEARCH_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+
+# Query fields that never change within a run; search_flights only adds the route/dates
+SEARCH_PARAMS = {
+    "adults": ADULTS,
+    "currencyCode": CURRENCY,
+    # Using API-side maxPrice keeps responses small (it's total for all pax)
+    "maxPrice": int(MAX_PRICE_TOTAL),
+    "nonStop": "false",
+}
+SEARCH_HEADERS = {
+    "Accept": "application/json",
+    # Offer JSON compresses ~5x; advertise every codec urllib3 can decode here
+    # (gzip/deflate always, br when the brotli package is installed)
+    "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
+}
+ENCODING_LOGGED = threading.Event()
+
+def search_flights(token: str, origin: str, dest_code: str, depart: dt.date, ret: dt.date,
+                   cached: Optional[Dict] = None) -> List[Offer]:
     """
     Flight Offers Search v2 — Self-Service.
     Note: No page[limit] or sort here; those params cause 400s.
+    One origin per call: the POST form's originDestinations are legs of a single
+    multi-city trip, not alternative origins, so origins can't be batched.
+    cached is the response main() loaded while planning; when given, no call is made.
     """
-    url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
-    headers = {"Authorization": f"Bearer {token}"}
+    if cached is not None:
+        log.info("Cached %s->%s depart=%s return=%s pax=%s", origin, dest_code, depart, ret, ADULTS)
+        return parse_offers(cached, MAX_PRICE_TOTAL)
+
+    # Debug: show exactly what we're querying
+    log.info("Searching %s->%s depart=%s return=%s pax=%s", origin, dest_code, depart, ret, ADULTS)
+
+    token = FRESH_TOKEN or token
+    headers = {**SEARCH_HEADERS, "Authorization": f"Bearer {token}"}
     params = {
+        **SEARCH_PARAMS,
         "originLocationCode": origin,
         "destinationLocationCode": dest_code,     # single code per call
         "departureDate": depart.isoformat(),
         "returnDate": ret.isoformat(),
-        "adults": ADULTS,
-        "currencyCode": CURRENCY,
-        # Using API-side maxPrice keeps responses small (it's total for all pax)
-        "maxPrice": int(MAX_PRICE_PER_PAX * ADULTS),
-        "nonStop": "false",
     }
 
-    # Simple retry/backoff for 429s
-    for attempt in range(4):  # 1 try + up to 3 retries
-        r = requests.get(url, headers=headers, params=params, timeout=40)
-        if r.status_code == 429:
-            wait = 2 ** attempt  # 1, 2, 4 seconds
-            print(f"[Amadeus 429] backing off {wait}s...")
-            time.sleep(wait)
-            continue
-
-        if not r.ok:
-            print(f"[Amadeus error {r.status_code}] {r.text[:500]}")
-            r.raise_for_status()
-
-        return r.json()
-
-    # If still 429 after retries, raise last response
-    r.raise_for_status()
+    LIMITER.wait()
+    r = SESSION.get(SEARCH_URL, headers=headers, params=params, timeout=40)
+    if r.status_code == 401 and token != FRESH_TOKEN:
+        new_token = refresh_token()
+        if new_token:
+            headers["Authorization"] = f"Bearer {new_token}"
+            LIMITER.wait()
+            r = SESSION.get(SEARCH_URL, headers=headers, params=params, timeout=40)
+    if not r.ok:
+        log.error("[Amadeus error %s] %s", r.status_code, r.text[:500])
+        r.raise_for_status()
 
-def summarize_offer(offer: Dict, origin: str, dest_shown: str) -> str:
-    price_total = offer["price"]["total"]
-    itineraries = offer.get("itineraries", [])
+    if not ENCODING_LOGGED.is_set():
+        ENCODING_LOGGED.set()
+        log.info("[Amadeus] Content-Encoding=%s", r.headers.get("Content-Encoding", "identity"))
 
-    def first_last_times(itin):
-        dep = itin["segments"][0]["departure"]["at"][:10]
-        arr = itin["segments"][-1]["arrival"]["at"][:10]
-        return dep, arr
+    data = json_loads(r.content)
+    save_cached_search(origin, dest_code, depart, ret, r.content)
+    return parse_offers(data, MAX_PRICE_TOTAL)
 
-    out_dep, _ = first_last_times(itineraries[0])
-    ret_dep, _ = first_last_times(itineraries[1])
-    carriers = set(seg["carrierCode"] for itin in itineraries for seg in itin["segments"])
-    carriers_str = ", ".join(sorted(carriers))
+def summarize_offer(offer: Offer, origin: str, dest_shown: str) -> str:
+    price_total = f"{offer.price:.2f}"
+    out_dep, ret_dep = offer.out_dep, offer.ret_dep
+    carriers_str = ", ".join(sorted(offer.carriers))
 
     return (
         f"✈️ {origin} → {dest_shown} (Tokyo)\n"
         f"Out: {out_dep}  |  Back: {ret_dep}\n"
-        f"Total: {CURRENCY} {price_total} for {ADULTS} adult(s) (≤ {int(MAX_PRICE_PER_PAX*ADULTS)})\n"
+        f"Total: {CURRENCY} {price_total} for {ADULTS} adult(s) (≤ {int(MAX_PRICE_TOTAL)})\n"
         f"Carriers: {carriers_str}\n"
         f"Tip: Search these dates on Google Flights/Chase Travel to book."
     )
 
 def main():
     token = get_token()
+    candidates = []  # (price, origin, dest_code, offer): cheapest under-cap offer per query
+
+    # Build the full query plan up front, then cap it to the per-run budget.
+    # Cached queries cost no API calls, so only live ones count against the cap.
+    # Cached responses are loaded here, so a cache entry that expires mid-run
+    # can't turn into a live call the budget never counted.
+    # Dates are the outer loop so origins interleave: the workers never all sit on
+    # one origin, and a dead origin has only a few searches in flight when it trips.
+    plan = []  # (query, cached response or None)
     requests_left = MAX_REQUESTS_PER_RUN
-    best = None  # (price_float, text)
+    for d, rdate in zip(DEPART_DATES, RETURN_DATES):
+        for origin in ORIGINS:
+            for dest_code in DEST_CODES:
+                cached = load_cached_search(origin, dest_code, d, rdate)
+                if cached is None:
+                    if requests_left <= 0:
+                        continue
+                    requests_left -= 1
+                plan.append(((origin, dest_code, d, rdate), cached))
 
-    for origin in ORIGINS:
-        for dest_code in DEST_CODES:
-            for d in daterange(DEPART_START, DEPART_END):
-                if d.weekday() not in DEPART_WEEKDAYS:
+    origin_fails = defaultdict(int)  # consecutive failures per origin
+    global_fails = 0                 # consecutive failures across all origins
+    aborted = False
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        futures = {pool.submit(search_flights, token, *query, cached): (query, cached is not None)
+                   for query, cached in plan}
+        for fut in as_completed(futures):
+            if fut.cancelled():
+                continue
+            (origin, dest_code, d, rdate), from_cache = futures[fut]
+            try:
+                offers = fut.result()
+            except Exception as e:
+                log.error("[%s->%s %s->%s] Request failed: %s", origin, dest_code, d, rdate, e)
+                if origin_fails[origin] >= ORIGIN_FAIL_LIMIT:
+                    # Already tripped: these were in flight when it tripped and can't be
+                    # cancelled, so they mustn't push the whole run over the global limit
                     continue
-                if requests_left <= 0:
+                origin_fails[origin] += 1
+                global_fails += 1
+                if global_fails >= GLOBAL_FAIL_LIMIT:
+                    log.error("[breaker] %d consecutive failures; aborting run", global_fails)
+                    for pending in futures:
+                        pending.cancel()
+                    aborted = True
                     break
-                rdate = d + dt.timedelta(days=TRIP_LENGTH)
-
-                # Debug: show exactly what we're querying
-                print(f"Searching {origin}->{dest_code} depart={d} return={rdate} pax={ADULTS}")
+                if origin_fails[origin] == ORIGIN_FAIL_LIMIT:
+                    log.error("[breaker] %d consecutive failures from %s; skipping its remaining dates",
+                              ORIGIN_FAIL_LIMIT, origin)
+                    for pending, (query, _) in futures.items():
+                        if query[0] == origin:
+                            pending.cancel()  # no-op for searches already running
+                continue
 
-                try:
-                    data = search_flights(token, origin, dest_code, d, rdate)
-                except Exception as e:
-                    print(f"[{origin}->{dest_code} {d}->{rdate}] Request failed: {e}")
-                    continue
+            # Only a live answer says Amadeus is healthy; cache hits finish instantly
+            # and would otherwise keep resetting the breaker
+            if not from_cache:
+                if origin_fails[origin] < ORIGIN_FAIL_LIMIT:
+                    origin_fails[origin] = 0  # a tripped origin stays tripped
+                global_fails = 0
 
-                requests_left -= 1
-                offers = data.get("data", [])
+            if not offers:
+                log.info("[%s->%s %s->%s] offers=0 min_total=None", origin, dest_code, d, rdate)
+                continue
 
-                # Light result summary per query
-                try:
-                    min_total = min(float(o["price"]["total"]) for o in offers) if offers else None
-                except Exception:
-                    min_total = None
-                print(f"[{origin}->{dest_code} {d}->{rdate}] offers={len(offers)} min_total={min_total}")
+            # Only each response's cheapest offer can win, so one min() pass per
+            # response feeds both the log line and the candidate list
+            cheapest = min(offers, key=attrgetter("price"))
+            min_total = cheapest.price
+            log.info("[%s->%s %s->%s] offers=%d min_total=%s", origin, dest_code, d, rdate, len(offers), min_total)
 
-                for offer in offers:
-                    try:
-                        total = float(offer["price"]["total"])
-                    except Exception:
-                        continue
-                    if total <= MAX_PRICE_PER_PAX * ADULTS:
-                        summary = summarize_offer(offer, origin, dest_code)
-                        if (best is None) or (total < best[0]):
-                            best = (total, summary)
+            candidates.append((min_total, origin, dest_code, cheapest))
 
-            if requests_left <= 0:
+            if EARLY_EXIT_FRAC and min_total <= MAX_PRICE_TOTAL * EARLY_EXIT_FRAC:
+                log.info("[early exit] %s is ≤ %.0f%% of the cap; skipping remaining searches", min_total, EARLY_EXIT_FRAC * 100)
+                for pending in futures:
+                    pending.cancel()  # no-op for searches already running
                 break
 
-    if best:
-        send_alert(best[1])
-        print("ALERT:", best[1])
+    # Every origin that had live searches tripped: that's an outage too, even if
+    # the failures never lined up GLOBAL_FAIL_LIMIT in a row (e.g. a single origin)
+    live_origins = {query[0] for query, cached in plan if cached is None}
+    if live_origins and all(origin_fails[o] >= ORIGIN_FAIL_LIMIT for o in live_origins):
+        log.error("[breaker] every origin tripped; failing the run")
+        aborted = True
+
+    # Only the winner gets formatted
+    if candidates:
+        _, origin, dest_code, offer = min(candidates, key=itemgetter(0))
+        summary = summarize_offer(offer, origin, dest_code)
+        # Sent synchronously: the alert is the point of the run, and the POST (with
+        # its 429 retries) must finish before the process exits
+        send_alert(summary)
+        log.info("ALERT: %s", summary)
     else:
         msg = "No deals under threshold this run."
         # Uncomment if you want a Discord ping even when nothing matches:
         # send_alert(msg)
-        print(msg)
+        log.info(msg)
+
+    if aborted:
+        raise SystemExit(1)  # fail the workflow run so the outage is visible
 
 if __name__ == "__main__":
-    main()
+    LOG_LISTENER.start()
+    try:
+        main()
+    finally:
+        LOG_LISTENER.stop()  # flushes anything still queued